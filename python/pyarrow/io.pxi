@@ -565,6 +565,11 @@ cdef class Buffer:
         def __get__(self):
             return self.buffer.get().size()
 
+    property address:
+
+        def __get__(self):
+            return <uintptr_t> self.buffer.get().data()
+
     property parent:
 
         def __get__(self):
@@ -51,8 +51,8 @@ class RecordBatchStreamReader(lib._RecordBatchReader, _ReadPandasOption):
 
     Parameters
     ----------
-    source : str, pyarrow.NativeFile, or file-like Python object
-        Either a file path, or a readable file object
+    source : str, pyarrow.NativeFile, pyarrow.Buffer, or file-like object
+        Either a file path, a buffer, or a readable file object
     """
     def __init__(self, source):
         self._open(source)
@@ -79,8 +79,8 @@ class RecordBatchFileReader(lib._RecordBatchFileReader, _ReadPandasOption):
 
     Parameters
     ----------
-    source : str, pyarrow.NativeFile, or file-like Python object
-        Either a file path, or a readable file object
+    source : str, pyarrow.NativeFile, pyarrow.Buffer, or file-like object
+        Either a file path, a buffer, or a readable file object
     footer_offset : int, default None
         If the file is embedded in some larger file, this is the byte offset to
         the very end of the file data
@@ -110,8 +110,8 @@ def open_stream(source):
 
     Parameters
     ----------
-    source : str, pyarrow.NativeFile, or file-like Python object
-        Either a file path, or a readable file object
+    source : str, pyarrow.NativeFile, pyarrow.Buffer, or file-like object
+        Either a file path, a buffer, or a readable file object
     footer_offset : int, default None
         If the file is embedded in some larger file, this is the byte offset to
         the very end of the file data
@@ -129,8 +129,8 @@ def open_file(source, footer_offset=None):
 
     Parameters
     ----------
-    source : str, pyarrow.NativeFile, or file-like Python object
-        Either a file path, or a readable file object
+    source : str, pyarrow.NativeFile, pyarrow.Buffer, or file-like object
+        Either a file path, a buffer, or a readable file object
     footer_offset : int, default None
         If the file is embedded in some larger file, this is the byte offset to
         the very end of the file data
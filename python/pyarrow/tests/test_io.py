@@ -170,6 +170,12 @@ def test_buffer_numpy():
     assert array.base == buf
 
 
+def test_buffer_address():
+    arr = np.arange(10, dtype='u1')
+    buf = pa.frombuffer(arr)
+    assert buf.address == arr.ctypes.data
+
+
 def test_buffer_memoryview_is_immutable():
     val = b'some data'
 
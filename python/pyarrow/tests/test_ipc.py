@@ -18,6 +18,7 @@
 import io
 import pytest
 import socket
+import struct
 import threading
 
 import numpy as np
@@ -29,151 +30,240 @@ from pyarrow.compat import unittest
 import pyarrow as pa
 
 
-class MessagingTest(object):
+# Seeded generator private to this module, so payloads are reproducible
+# and independent of the global NumPy random state
+_RNG = np.random.RandomState(0)
 
-    def setUp(self):
-        self.sink = self._get_sink()
+# Zero-length end-of-stream marker written after the stream on TCP sockets
+_SENTINEL = struct.pack('i', 0)
 
-    def _get_sink(self):
-        return io.BytesIO()
 
-    def _get_source(self):
-        return self.sink.getvalue()
+def write_batches(writer_factory, sink_factory, num_batches=5, rng=None):
+    """
+    Write num_batches small record batches to a new sink. Returns (frames,
+    batches, sink)
+    """
+    if rng is None:
+        rng = _RNG
+    nrows = 5
+    strings = ['foo', None, 'bar', 'bazbaz', 'qux']
 
-    def write_batches(self, num_batches=5):
-        nrows = 5
-        df = pd.DataFrame({
-            'one': np.random.randn(nrows),
-            'two': ['foo', np.nan, 'bar', 'bazbaz', 'qux']})
-        batch = pa.RecordBatch.from_pandas(df)
-
-        writer = self._get_writer(self.sink, batch.schema)
-
-        frames = []
-        batches = []
-        for i in range(num_batches):
-            unique_df = df.copy()
-            unique_df['one'] = np.random.randn(len(df))
-
-            batch = pa.RecordBatch.from_pandas(unique_df)
-            writer.write_batch(batch)
-            frames.append(unique_df)
-            batches.append(batch)
-
-        writer.close()
-        return frames, batches
+    # Build the string column and schema once and only regenerate the
+    # float column per batch, bypassing pandas conversion in the loop
+    str_values = np.array(strings, dtype=object)
+    str_arr = pa.array(strings, type=pa.string())
+    schema = pa.schema([pa.field('one', pa.float64()),
+                        pa.field('two', pa.string())])
 
+    # Draw all the float data at once; each batch gets a zero-copy slice
+    all_floats = rng.randn(num_batches * nrows)
 
-class TestFile(MessagingTest, unittest.TestCase):
-    # Also tests writing zero-copy NumPy array with additional padding
+    sink = sink_factory()
+    writer = writer_factory(sink, schema)
 
-    def _get_writer(self, sink, schema):
-        return pa.RecordBatchFileWriter(sink, schema)
+    frames = []
+    batches = []
+    for i in range(num_batches):
+        floats = all_floats[i * nrows:(i + 1) * nrows]
+        unique_df = pd.DataFrame({'one': floats, 'two': str_values},
+                                 columns=['one', 'two'])
 
-    def test_empty_file(self):
-        buf = io.BytesIO(b'')
-        with pytest.raises(pa.ArrowInvalid):
-            pa.open_file(buf)
+        float_arr = pa.Array.from_pandas(floats)
+        batch = pa.RecordBatch.from_arrays([float_arr, str_arr],
+                                           ['one', 'two'])
+        writer.write_batch(batch)
+        frames.append(unique_df)
+        batches.append(batch)
 
-    def test_simple_roundtrip(self):
-        _, batches = self.write_batches()
-        file_contents = pa.BufferReader(self._get_source())
+    writer.close()
+    return frames, batches, sink
 
-        reader = pa.open_file(file_contents)
 
-        assert reader.num_record_batches == len(batches)
+FILE_MODE = ('file', pa.RecordBatchFileWriter, pa.open_file)
+STREAM_MODE = ('stream', pa.RecordBatchStreamWriter, pa.open_stream)
 
-        for i, batch in enumerate(batches):
-            # it works. Must convert back to DataFrame
-            batch = reader.get_batch(i)
-            assert batches[i].equals(batch)
-            assert reader.schema.equals(batches[0].schema)
+_IPC_PAYLOADS = {}
 
-    def test_read_all(self):
-        _, batches = self.write_batches()
-        file_contents = pa.BufferReader(self._get_source())
 
-        reader = pa.open_file(file_contents)
+def _ipc_payload(mode, num_batches=5):
+    """
+    Memoized (frames, batches, buffer) for FILE_MODE or STREAM_MODE. The
+    data comes from a freshly seeded generator, so a cached payload is the
+    same whichever test builds it first. Callers must not mutate the
+    returned objects
+    """
+    name, writer_cls, _ = mode
+    key = (name, num_batches)
+    if key not in _IPC_PAYLOADS:
+        frames, batches, sink = write_batches(writer_cls,
+                                              pa.BufferOutputStream,
+                                              num_batches,
+                                              rng=np.random.RandomState(0))
+        _IPC_PAYLOADS[key] = frames, batches, sink.get_result()
+    return _IPC_PAYLOADS[key]
 
-        result = reader.read_all()
-        expected = pa.Table.from_batches(batches)
-        assert result.equals(expected)
 
-    def test_read_pandas(self):
-        frames, _ = self.write_batches()
+@pytest.fixture(scope='module', params=[FILE_MODE, STREAM_MODE],
+                ids=['file', 'stream'])
+def ipc_mode(request):
+    """
+    (name, writer class, reader function) for each IPC format
+    """
+    return request.param
 
-        file_contents = pa.BufferReader(self._get_source())
-        reader = pa.open_file(file_contents)
-        result = reader.read_pandas()
 
-        expected = pd.concat(frames)
-        assert_frame_equal(result, expected)
+@pytest.fixture(scope='module')
+def ipc_corpus(ipc_mode):
+    """
+    Serialized IPC payload for the current ipc_mode, shared by the
+    read-path tests. Returns (frames, batches, buffer); each test must wrap
+    the buffer in its own reader
+    """
+    return _ipc_payload(ipc_mode)
 
 
-class TestStream(MessagingTest, unittest.TestCase):
+@pytest.fixture(scope='module')
+def expected_table(ipc_corpus):
+    """
+    Table.from_batches over the corpus batches, built once per ipc_mode
+    """
+    _, batches, _ = ipc_corpus
+    return pa.Table.from_batches(batches)
 
-    def _get_writer(self, sink, schema):
-        return pa.RecordBatchStreamWriter(sink, schema)
 
-    def test_empty_stream(self):
-        buf = io.BytesIO(b'')
-        with pytest.raises(pa.ArrowInvalid):
-            pa.open_stream(buf)
-
-    def test_categorical_roundtrip(self):
-        df = pd.DataFrame({
-            'one': np.random.randn(5),
-            'two': pd.Categorical(['foo', np.nan, 'bar', 'foo', 'foo'],
-                                  categories=['foo', 'bar'],
-                                  ordered=True)
-        })
-        batch = pa.RecordBatch.from_pandas(df)
-        writer = self._get_writer(self.sink, batch.schema)
-        writer.write_batch(pa.RecordBatch.from_pandas(df))
-        writer.close()
-
-        table = (pa.open_stream(pa.BufferReader(self._get_source()))
-                 .read_all())
-        assert_frame_equal(table.to_pandas(), df)
+@pytest.fixture(scope='module')
+def expected_frame(ipc_corpus):
+    """
+    Concatenation of the corpus frames, built once per ipc_mode
+    """
+    frames, _, _ = ipc_corpus
+    return pd.concat(frames, ignore_index=True)
 
-    def test_simple_roundtrip(self):
-        _, batches = self.write_batches()
-        file_contents = pa.BufferReader(self._get_source())
-        reader = pa.open_stream(file_contents)
 
-        assert reader.schema.equals(batches[0].schema)
+file_only = pytest.mark.parametrize('ipc_mode', [FILE_MODE],
+                                    ids=['file'], indirect=True)
+stream_only = pytest.mark.parametrize('ipc_mode', [STREAM_MODE],
+                                      ids=['stream'], indirect=True)
 
-        total = 0
-        for i, next_batch in enumerate(reader):
-            assert next_batch.equals(batches[i])
-            total += 1
 
-        assert total == len(batches)
+@file_only
+def test_file_simple_roundtrip(ipc_corpus):
+    _, batches, data = ipc_corpus
+    reader = pa.open_file(pa.BufferReader(data))
 
-        with pytest.raises(StopIteration):
-            reader.get_next_batch()
+    assert reader.schema.equals(batches[0].schema)
+    assert reader.num_record_batches == len(batches)
 
-    def test_read_all(self):
-        _, batches = self.write_batches()
-        file_contents = pa.BufferReader(self._get_source())
-        reader = pa.open_stream(file_contents)
+    for i, batch in enumerate(batches):
+        assert reader.get_batch(i).equals(batch)
 
-        result = reader.read_all()
-        expected = pa.Table.from_batches(batches)
-        assert result.equals(expected)
 
+@stream_only
+def test_stream_simple_roundtrip(ipc_corpus, expected_table):
+    _, batches, data = ipc_corpus
+    reader = pa.open_stream(pa.BufferReader(data))
 
-class TestMessageReader(MessagingTest, unittest.TestCase):
+    assert reader.schema.equals(batches[0].schema)
 
-    def _get_example_messages(self):
-        _, batches = self.write_batches()
-        file_contents = self._get_source()
-        buf_reader = pa.BufferReader(file_contents)
-        reader = pa.MessageReader.open_stream(buf_reader)
-        return batches, list(reader)
+    read_batches = list(reader)
+    assert len(read_batches) == len(batches)
+
+    result = pa.Table.from_batches(read_batches)
+    assert result.equals(expected_table)
+
+    with pytest.raises(StopIteration):
+        reader.get_next_batch()
+
+
+def test_read_all(ipc_mode, ipc_corpus, expected_table):
+    _, _, open_reader = ipc_mode
+    _, _, data = ipc_corpus
+    # Readers accept a pa.Buffer directly and read it without copying
+    reader = open_reader(data)
+
+    result = reader.read_all()
+    assert result.equals(expected_table)
+
+
+@file_only
+def test_read_pandas(ipc_corpus, expected_frame):
+    # The one dedicated pandas round-trip; other tests compare Arrow tables
+    _, _, data = ipc_corpus
+    reader = pa.open_file(pa.BufferReader(data))
+    result = reader.read_pandas()
+
+    assert_frame_equal(result, expected_frame)
+
+
+def test_empty_file():
+    buf = io.BytesIO(b'')
+    with pytest.raises(pa.ArrowInvalid):
+        pa.open_file(buf)
 
-    def _get_writer(self, sink, schema):
-        return pa.RecordBatchStreamWriter(sink, schema)
+
+def test_empty_stream():
+    buf = io.BytesIO(b'')
+    with pytest.raises(pa.ArrowInvalid):
+        pa.open_stream(buf)
+
+
+def test_categorical_roundtrip():
+    float_arr = pa.Array.from_pandas(_RNG.randn(5))
+    indices = np.array([0, -1, 1, 0, 0], dtype='i1')
+    dictionary = pa.array(['foo', 'bar'])
+    dict_arr = pa.DictionaryArray.from_arrays(indices, dictionary,
+                                              ordered=True)
+    batch = pa.RecordBatch.from_arrays([float_arr, dict_arr], ['one', 'two'])
+
+    sink = pa.BufferOutputStream()
+    writer = pa.RecordBatchStreamWriter(sink, batch.schema)
+    writer.write_batch(batch)
+    writer.close()
+
+    table = (pa.open_stream(pa.BufferReader(sink.get_result()))
+             .read_all())
+    expected = pa.Table.from_arrays([float_arr, dict_arr],
+                                    names=['one', 'two'])
+    assert table.equals(expected)
+
+
+def test_categorical_pandas_roundtrip():
+    df = pd.DataFrame({
+        'one': _RNG.randn(5),
+        'two': pd.Categorical(['foo', np.nan, 'bar', 'foo', 'foo'],
+                              categories=['foo', 'bar'],
+                              ordered=True)
+    })
+    sink = pa.BufferOutputStream()
+    batch = pa.RecordBatch.from_pandas(df)
+    writer = pa.RecordBatchStreamWriter(sink, batch.schema)
+    writer.write_batch(batch)
+    writer.close()
+
+    table = (pa.open_stream(pa.BufferReader(sink.get_result()))
+             .read_all())
+    assert_frame_equal(table.to_pandas(), df)
+
+
+class TestMessageReader(object):
+
+    def _open_message_reader(self, ipc_corpus):
+        _, _, data = ipc_corpus
+        return pa.MessageReader.open_stream(pa.BufferReader(data))
+
+    def _first_message(self, ipc_corpus):
+        return self._open_message_reader(ipc_corpus).read_next_message()
+
+    def _iter_messages_with_batches(self, ipc_corpus):
+        """
+        Yield (message, batch) for each record batch message, skipping the
+        leading schema message
+        """
+        _, batches, _ = ipc_corpus
+        reader = self._open_message_reader(ipc_corpus)
+        reader.read_next_message()
+        for batch in batches:
+            yield reader.read_next_message(), batch
 
     def test_ctors_no_segfault(self):
         with pytest.raises(TypeError):
@@ -182,18 +272,21 @@ class TestMessageReader(MessagingTest, unittest.TestCase):
         with pytest.raises(TypeError):
             repr(pa.MessageReader())
 
-    def test_message_reader(self):
-        _, messages = self._get_example_messages()
+    @stream_only
+    def test_message_reader(self, ipc_corpus):
+        reader = self._open_message_reader(ipc_corpus)
 
-        assert len(messages) == 6
-        assert messages[0].type == 'schema'
-        for msg in messages[1:]:
-            assert msg.type == 'record batch'
+        assert reader.read_next_message().type == 'schema'
 
-    def test_serialize_read_message(self):
-        _, messages = self._get_example_messages()
+        count = 0
+        for msg in reader:
+            assert msg.type == 'record batch'
+            count += 1
+        assert count == len(ipc_corpus[1])
 
-        msg = messages[0]
+    @stream_only
+    def test_serialize_read_message(self, ipc_corpus):
+        msg = self._first_message(ipc_corpus)
         buf = msg.serialize()
 
         restored = pa.read_message(buf)
@@ -204,42 +297,80 @@ class TestMessageReader(MessagingTest, unittest.TestCase):
         assert msg.equals(restored2)
         assert msg.equals(restored3)
 
-    def test_read_record_batch(self):
-        batches, messages = self._get_example_messages()
-
-        for batch, message in zip(batches, messages[1:]):
+    @stream_only
+    def test_read_message_zero_copy(self, ipc_corpus):
+        # Record batch message, so there is a body to check
+        msg, _ = next(self._iter_messages_with_batches(ipc_corpus))
+        buf = msg.serialize()
+        data = buf.to_pybytes()
+
+        # The body is written last, right after the length-prefixed metadata
+        body_offset = buf.size - msg.body.size
+
+        for source, base in [(buf, buf.address),
+                             (data, pa.frombuffer(data).address)]:
+            restored = pa.read_message(source)
+            assert msg.equals(restored)
+            assert restored.body.address == base + body_offset, \
+                ('read_message copied the message body for input of type '
+                 '{0}'.format(type(source).__name__))
+
+    @stream_only
+    def test_read_record_batch(self, ipc_corpus):
+        for message, batch in self._iter_messages_with_batches(ipc_corpus):
             read_batch = pa.read_record_batch(message, batch.schema)
             assert read_batch.equals(batch)
 
-    def test_read_pandas(self):
-        frames, _ = self.write_batches()
-        file_contents = pa.BufferReader(self._get_source())
-        reader = pa.open_stream(file_contents)
-        result = reader.read_pandas()
 
-        expected = pd.concat(frames)
-        assert_frame_equal(result, expected)
+class MessagingTest(object):
+
+    def setUp(self):
+        self.sink = self._get_sink()
+
+    def _get_sink(self):
+        return pa.BufferOutputStream()
+
+    def _get_source(self):
+        return self.sink.get_result()
+
+    def write_batches(self, num_batches=5):
+        frames, batches, _ = write_batches(self._get_writer,
+                                           lambda: self.sink, num_batches)
+        return frames, batches
 
 
 class TestSocket(MessagingTest, unittest.TestCase):
 
     class StreamReaderServer(threading.Thread):
 
-        def init(self, do_read_all):
-            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._sock.bind(('127.0.0.1', 0))
-            self._sock.listen(1)
-            host, port = self._sock.getsockname()
+        def init(self, do_read_all, connection=None):
+            """
+            Read from the preconnected socket if one is passed, otherwise
+            listen on a loopback TCP port and return it
+            """
+            self._connection = connection
             self._do_read_all = do_read_all
             self._schema = None
             self._batches = []
             self._table = None
+
+            if connection is not None:
+                return None
+
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.bind(('127.0.0.1', 0))
+            self._sock.listen(1)
+            host, port = self._sock.getsockname()
             return port
 
         def run(self):
-            connection, client_address = self._sock.accept()
+            connection = self._connection
+            if connection is None:
+                connection, client_address = self._sock.accept()
+            # The buffered file object is still needed: PythonFile does not
+            # retry short reads, which a raw socket can return
+            source = pa.PythonFile(connection.makefile(mode='rb'), mode='r')
             try:
-                source = connection.makefile(mode='rb')
                 reader = pa.open_stream(source)
                 self._schema = reader.schema
                 if self._do_read_all:
@@ -248,6 +379,9 @@ class TestSocket(MessagingTest, unittest.TestCase):
                     for i, batch in enumerate(reader):
                         self._batches.append(batch)
             finally:
+                # The socket is only released once the file object made from
+                # it is closed as well
+                source.close()
                 connection.close()
 
         def get_result(self):
@@ -260,16 +394,23 @@ class TestSocket(MessagingTest, unittest.TestCase):
 
     def start_server(self, do_read_all):
         self._server = TestSocket.StreamReaderServer()
-        port = self._server.init(do_read_all)
-        self._server.start()
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._sock.connect(('127.0.0.1', port))
+        self._use_socketpair = hasattr(socket, 'socketpair')
+        if self._use_socketpair:
+            # A connected pair avoids the listen/accept and TCP handshake
+            server_sock, self._sock = socket.socketpair()
+            self._server.init(do_read_all, connection=server_sock)
+            self._server.start()
+        else:
+            port = self._server.init(do_read_all)
+            self._server.start()
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.connect(('127.0.0.1', port))
         self.sink = self._get_sink()
 
     def stop_and_get_result(self):
-        import struct
-        self.sink.write(struct.pack('i', 0))
-        self.sink.flush()
+        if not self._use_socketpair:
+            self.sink.write(_SENTINEL)
+        self.sink.close()
         self._sock.close()
         self._server.join()
         return self._server.get_result()
@@ -287,8 +428,10 @@ class TestSocket(MessagingTest, unittest.TestCase):
 
         assert reader_schema.equals(writer_batches[0].schema)
         assert len(reader_batches) == len(writer_batches)
-        for i, batch in enumerate(writer_batches):
-            assert reader_batches[i].equals(batch)
+
+        result = pa.Table.from_batches(reader_batches)
+        expected = pa.Table.from_batches(writer_batches)
+        assert result.equals(expected)
 
     def test_read_all(self):
         self.start_server(do_read_all=True)
@@ -299,13 +442,25 @@ class TestSocket(MessagingTest, unittest.TestCase):
         assert result.equals(expected)
 
 
-class TestInMemoryFile(TestFile):
+class TestBytesIOFile(MessagingTest, unittest.TestCase):
+    # Writing through a Python file object goes through PythonFile
 
     def _get_sink(self):
-        return pa.BufferOutputStream()
+        return io.BytesIO()
 
     def _get_source(self):
-        return self.sink.get_result()
+        return self.sink.getvalue()
+
+    def _get_writer(self, sink, schema):
+        return pa.RecordBatchFileWriter(sink, schema)
+
+    def test_simple_roundtrip(self):
+        _, batches = self.write_batches()
+        reader = pa.open_file(pa.BufferReader(self._get_source()))
+
+        assert reader.num_record_batches == len(batches)
+        for i, batch in enumerate(batches):
+            assert reader.get_batch(i).equals(batch)
 
 
 def test_ipc_zero_copy_numpy():
@@ -327,7 +482,7 @@ def test_ipc_zero_copy_numpy():
 def test_get_record_batch_size():
     N = 10
     itemsize = 8
-    df = pd.DataFrame({'foo': np.random.randn(N)})
+    df = pd.DataFrame({'foo': _RNG.randn(N)})
 
     batch = pa.RecordBatch.from_pandas(df)
     assert pa.get_record_batch_size(batch) > (N * itemsize)